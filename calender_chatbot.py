@@ -1,7 +1,12 @@
+import asyncio
+import atexit
+import concurrent.futures
 import datetime
+import functools
+import json
 import os.path
 import logging
-import pytz
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -9,7 +14,7 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 
 try:
@@ -18,14 +23,32 @@ except ImportError:
     notification = None
     print("Warning: Plyer not installed. Desktop notifications will not be available. Install with 'pip install plyer'")
 
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 TOKEN_FILE = 'token.json'
 CREDENTIALS_FILE = 'credentials.json'
+_STATE_FILE = 'sent_reminders.json'
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-LOCAL_TIMEZONE = pytz.timezone('Asia/Kolkata')
+LOCAL_TIMEZONE_NAME = 'Asia/Kolkata'
+try:
+    LOCAL_TIMEZONE = ZoneInfo(LOCAL_TIMEZONE_NAME)
+except ZoneInfoNotFoundError:
+    # Windows has no system tz database; zoneinfo needs the tzdata package there.
+    # Asia/Kolkata has had a fixed +05:30 offset with no DST since 1945.
+    LOCAL_TIMEZONE = datetime.timezone(datetime.timedelta(hours=5, minutes=30), 'IST')
+    print("Warning: No time zone database found. Using a fixed +05:30 offset. Install with 'pip install tzdata'")
+UTC = datetime.timezone.utc
+
+@functools.lru_cache(maxsize=8)
+def _tzname_for(event_date):
+    return LOCAL_TIMEZONE.tzname(datetime.datetime.combine(event_date, datetime.time(12)))
 
 def get_calendar_service():
     creds = None
@@ -42,21 +65,18 @@ def get_calendar_service():
     service = build('calendar', 'v3', credentials=creds)
     return service
 
-def create_event(service, summary, start_time_local, end_time_local, description=None, location=None, attendees=None, minutes_before_reminder=15):
-    start_time_utc = start_time_local.astimezone(pytz.utc)
-    end_time_utc = end_time_local.astimezone(pytz.utc)
-
+def build_event_body(summary, start_time_local, end_time_local, description=None, location=None, attendees=None, minutes_before_reminder=15):
     event = {
         'summary': summary,
         'location': location,
         'description': description,
         'start': {
-            'dateTime': start_time_utc.isoformat(),
-            'timeZone': 'UTC',
+            'dateTime': start_time_local.isoformat(),
+            'timeZone': LOCAL_TIMEZONE_NAME,
         },
         'end': {
-            'dateTime': end_time_utc.isoformat(),
-            'timeZone': 'UTC',
+            'dateTime': end_time_local.isoformat(),
+            'timeZone': LOCAL_TIMEZONE_NAME,
         },
         'reminders': {
             'useDefault': False,
@@ -68,6 +88,10 @@ def create_event(service, summary, start_time_local, end_time_local, description
     }
     if attendees:
         event['attendees'] = [{'email': email} for email in attendees]
+    return event
+
+def create_event(service, summary, start_time_local, end_time_local, description=None, location=None, attendees=None, minutes_before_reminder=15):
+    event = build_event_body(summary, start_time_local, end_time_local, description, location, attendees, minutes_before_reminder)
 
     try:
         event = service.events().insert(calendarId='primary', body=event).execute()
@@ -77,24 +101,44 @@ def create_event(service, summary, start_time_local, end_time_local, description
         logger.error(f"An error occurred while creating event: {error}")
         return None
 
+BATCH_SIZE = 50
+
+def create_events_batch(service, events_payloads):
+    created_events = []
+
+    def on_event_created(request_id, response, exception):
+        if exception is not None:
+            logger.error(f"An error occurred while creating event in batch: {exception}")
+            return
+        logger.info(f"Event created: {response.get('htmlLink')}")
+        created_events.append(response)
+
+    for offset in range(0, len(events_payloads), BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=on_event_created)
+        for event in events_payloads[offset:offset + BATCH_SIZE]:
+            batch.add(service.events().insert(calendarId='primary', body=event))
+        try:
+            batch.execute()
+        except HttpError as error:
+            logger.error(f"An error occurred while sending event batch: {error}")
+    return created_events
+
 def get_upcoming_events(service, max_results=10, time_min_local=None, time_max_local=None):
     if time_min_local is None:
         time_min_local = datetime.datetime.now(LOCAL_TIMEZONE)
     if time_max_local is None:
         time_max_local = time_min_local + datetime.timedelta(days=7)
 
-    time_min_utc = time_min_local.astimezone(pytz.utc).isoformat()
-    time_max_utc = time_max_local.astimezone(pytz.utc).isoformat()
-
     logger.info(f'Getting upcoming events from {time_min_local.strftime("%Y-%m-%d %H:%M")} to {time_max_local.strftime("%Y-%m-%d %H:%M")}')
     try:
         events_result = service.events().list(
             calendarId='primary',
-            timeMin=time_min_utc,
-            timeMax=time_max_utc,
+            timeMin=time_min_local.isoformat(),
+            timeMax=time_max_local.isoformat(),
             maxResults=max_results,
             singleEvents=True,
-            orderBy='startTime'
+            orderBy='startTime',
+            fields='items(id,summary,htmlLink,start)'
         ).execute()
         events = events_result.get('items', [])
         return events
@@ -102,126 +146,340 @@ def get_upcoming_events(service, max_results=10, time_min_local=None, time_max_l
         logger.error(f"An error occurred while fetching events: {error}")
         return []
 
+# UTC offset string ("Z", "+05:30", ...) -> shared tzinfo, so events in the
+# same zone reuse one object instead of each parse building its own.
+_OFFSET_CACHE = {'Z': UTC}
+
+def _tz_for_offset(offset):
+    tz = _OFFSET_CACHE.get(offset)
+    if tz is None:
+        sign = -1 if offset[0] == '-' else 1
+        tz = datetime.timezone(sign * datetime.timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6])))
+        _OFFSET_CACHE[offset] = tz
+    return tz
+
+def parse_rfc3339(value):
+    if ciso8601:
+        return ciso8601.parse_rfc3339(value)
+    if value.endswith('Z'):
+        local_part, offset = value[:-1], 'Z'
+    elif len(value) > 6 and value[-6] in '+-' and value[-3] == ':':
+        local_part, offset = value[:-6], value[-6:]
+    else:
+        return datetime.datetime.fromisoformat(value)
+    return datetime.datetime.fromisoformat(local_part).replace(tzinfo=_tz_for_offset(offset))
+
+# event id -> (start, event). start is a local datetime, or a date for all-day
+# events, parsed once when the event is synced rather than on every tick.
+EVENT_CACHE = {}
+SYNC_TOKEN = None
+
+def _parse_event_start(event):
+    start_data = event['start']
+    if 'dateTime' in start_data:
+        return parse_rfc3339(start_data['dateTime']).astimezone(LOCAL_TIMEZONE)
+    return datetime.date.fromisoformat(start_data['date'])
+
+def _is_past(start, cutoff, today):
+    if isinstance(start, datetime.datetime):
+        return start < cutoff
+    return start < today
+
+def evict_past_events(now_local):
+    cutoff = now_local - _CHECK_WINDOW_BEHIND
+    today = now_local.date()
+    past = [event_id for event_id, (start, _) in EVENT_CACHE.items() if _is_past(start, cutoff, today)]
+    for event_id in past:
+        del EVENT_CACHE[event_id]
+
+def sync_events(service, now_local):
+    global SYNC_TOKEN
+    list_kwargs = {
+        'calendarId': 'primary',
+        'singleEvents': True,
+        'fields': 'nextPageToken,nextSyncToken,items(id,status,summary,htmlLink,start)',
+    }
+    if SYNC_TOKEN:
+        list_kwargs['syncToken'] = SYNC_TOKEN
+    else:
+        logger.info("Performing full calendar sync.")
+        EVENT_CACHE.clear()
+
+    # Events that are already over are never cached, so a full sync only keeps
+    # what is still ahead of us.
+    cutoff = now_local - _CHECK_WINDOW_BEHIND
+    today = now_local.date()
+    page_token = None
+    try:
+        while True:
+            events_result = service.events().list(pageToken=page_token, **list_kwargs).execute()
+            for event in events_result.get('items', []):
+                event_id = event['id']
+                if event.get('status') == 'cancelled':
+                    EVENT_CACHE.pop(event_id, None)
+                    continue
+                try:
+                    start = _parse_event_start(event)
+                except ValueError:
+                    logger.error(f"Failed to parse event start time for {event.get('summary', 'No Title')}: {event['start']}")
+                    EVENT_CACHE.pop(event_id, None)
+                    continue
+                if _is_past(start, cutoff, today):
+                    EVENT_CACHE.pop(event_id, None)
+                else:
+                    EVENT_CACHE[event_id] = (start, event)
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                break
+    except HttpError as error:
+        if error.resp.status == 410 and SYNC_TOKEN:
+            logger.warning("Sync token expired, falling back to a full sync.")
+            SYNC_TOKEN = None
+            return sync_events(service, now_local)
+        logger.error(f"An error occurred while syncing events: {error}")
+        return EVENT_CACHE
+
+    SYNC_TOKEN = events_result.get('nextSyncToken')
+    return EVENT_CACHE
+
+# Reminder bounds are in seconds relative to the event start: comparing floats
+# is much cheaper than comparing (and subtracting) timedelta objects.
+# (threshold minutes, threshold seconds), largest first
+_REMINDER_THRESHOLDS_SORTED = [
+    (15, 15 * 60),
+    (5, 5 * 60),
+    (1, 60),
+]
+_STARTED_WINDOW_SECS = (-5 * 60, 0)
+_TRIGGER_LO_SECS = -10
+_TRIGGER_HI_SECS = 60
+_LATEST_TRIGGER_SECS = _REMINDER_THRESHOLDS_SORTED[0][1] + _TRIGGER_HI_SECS
+_CHECK_WINDOW_BEHIND = datetime.timedelta(minutes=5)
+
+_FLAG_STARTED = 1 << 0
+_FLAG_15 = 1 << 1
+_FLAG_5 = 1 << 2
+_FLAG_1 = 1 << 3
+_FLAG_ALLDAY = 1 << 4
+_THRESHOLD_BITS = {15: _FLAG_15, 5: _FLAG_5, 1: _FLAG_1}
+# Once either of these has fired there is nothing left to send for the event.
+_FLAGS_DONE = _FLAG_STARTED | _FLAG_ALLDAY
+
+# event id -> bitmask of the _FLAG_* reminders already sent for it
 SENT_REMINDERS = {}
+# event id -> start time the SENT_REMINDERS flags were recorded for; also used
+# to expire the entry
+_REMINDER_STARTS = {}
+_PURGE_OLDER_THAN = datetime.timedelta(hours=2)
+
+def _reminder_start(start):
+    if isinstance(start, datetime.datetime):
+        return start
+    # All-day events stay relevant until the day is over.
+    return datetime.datetime.combine(start + datetime.timedelta(days=1), datetime.time(), LOCAL_TIMEZONE)
+
+def purge_sent_reminders(now_local):
+    cutoff = now_local - _PURGE_OLDER_THAN
+    expired = [event_id for event_id, start in _REMINDER_STARTS.items() if start < cutoff]
+    for event_id in expired:
+        del _REMINDER_STARTS[event_id]
+        SENT_REMINDERS.pop(event_id, None)
+    return bool(expired)
+
+def _atomic_write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save_sent_reminders():
+    state = {
+        'sent': SENT_REMINDERS,
+        'starts': {event_id: _REMINDER_STARTS[event_id].isoformat() for event_id in SENT_REMINDERS if event_id in _REMINDER_STARTS},
+    }
+    try:
+        _atomic_write_json(_STATE_FILE, state)
+    except OSError as e:
+        logger.error(f"Failed to save reminder state to {_STATE_FILE}: {e}")
+
+def load_sent_reminders():
+    if not os.path.exists(_STATE_FILE):
+        return
+    try:
+        with open(_STATE_FILE) as f:
+            state = json.load(f)
+        sent = state['sent']
+        if not isinstance(sent, dict) or not all(isinstance(flags, int) for flags in sent.values()):
+            raise TypeError("'sent' must map event ids to integer flags")
+        starts = {event_id: datetime.datetime.fromisoformat(start) for event_id, start in state['starts'].items()}
+        if any(start.tzinfo is None for start in starts.values()):
+            raise ValueError("'starts' must hold timezone-aware timestamps")
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning(f"Ignoring unreadable reminder state in {_STATE_FILE}: {e}")
+        return
+    SENT_REMINDERS.update(sent)
+    _REMINDER_STARTS.update(starts)
+    logger.info(f"Loaded reminder state for {len(SENT_REMINDERS)} events from {_STATE_FILE}.")
+
+_NOTIFY_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+atexit.register(_NOTIFY_POOL.shutdown)
+
+def _notify_desktop(title, message):
+    try:
+        notification.notify(
+            title=title,
+            message=message,
+            app_name='Virtual Event Scheduler',
+            timeout=10
+        )
+        logger.info(f"Desktop Notification Sent: {title} - {message}")
+    except Exception as e:
+        logger.error(f"Failed to send desktop notification: {e}")
+        logger.info(f"Console Reminder: {title} - {message}")
 
 def send_notification(title, message):
     if notification:
-        try:
-            notification.notify(
-                title=title,
-                message=message,
-                app_name='Virtual Event Scheduler',
-                timeout=10
-            )
-            logger.info(f"Desktop Notification Sent: {title} - {message}")
-        except Exception as e:
-            logger.error(f"Failed to send desktop notification: {e}")
-            logger.info(f"Console Reminder: {title} - {message}")
+        _NOTIFY_POOL.submit(_notify_desktop, title, message)
     else:
         logger.info(f"Console Reminder: {title} - {message}")
 
-def check_and_remind(service):
-    now_local = datetime.datetime.now(LOCAL_TIMEZONE)
-    logger.info(f"Running reminder check at {now_local.strftime('%Y-%m-%d %H:%M:%S')}")
-
-    fetch_start_time = now_local - datetime.timedelta(minutes=5)
-    fetch_end_time = now_local + datetime.timedelta(minutes=60)
+def _make_checker(thresholds_bits):
+    # Everything the per-event check touches is bound to a local here, so the
+    # hot path runs on LOAD_FAST instead of global and attribute lookups.
+    datetime_type = datetime.datetime
+    tzname_for = _tzname_for
+    notify = send_notification
+    log = logger
+    latest_trigger = _LATEST_TRIGGER_SECS
+    started_lo, started_hi = _STARTED_WINDOW_SECS
+    trigger_lo = _TRIGGER_LO_SECS
+    trigger_hi = _TRIGGER_HI_SECS
+    flag_started = _FLAG_STARTED
+    flag_allday = _FLAG_ALLDAY
+    thresholds = [
+        (threshold_minutes, threshold_secs, thresholds_bits[threshold_minutes])
+        for threshold_minutes, threshold_secs in _REMINDER_THRESHOLDS_SORTED
+    ]
+
+    # Returns the _FLAG_* bit of the reminder sent, or 0 if none was due.
+    def check(event, start, now_local, flags):
+        if not isinstance(start, datetime_type):
+            if start != now_local.date() or flags & flag_allday:
+                return 0
+            event_summary = event.get('summary', 'No Title')
+            event_html_link = event.get('htmlLink', '#')
+            title = f"All-Day Event Today: {event_summary}"
+            message = f"This all-day event is happening today! Details: {event_html_link}"
+            notify(title, message)
+            log.info(f"All-day event notification sent for '{event_summary}'.")
+            return flag_allday
+
+        # Anything before the check window has already been evicted from the cache.
+        event_start_time_local = start
+        time_to_event_secs = (event_start_time_local - now_local).total_seconds()
+        if time_to_event_secs >= latest_trigger:
+            return 0
 
-    events = get_upcoming_events(service, time_min_local=fetch_start_time, time_max_local=fetch_end_time, max_results=20)
-
-    if not events:
-        logger.info("No upcoming events found in the current check window.")
-        return
-
-    for event in events:
-        event_id = event['id']
         event_summary = event.get('summary', 'No Title')
         event_html_link = event.get('htmlLink', '#')
 
-        if event_id not in SENT_REMINDERS:
-            SENT_REMINDERS[event_id] = {}
-
-        start_data = event['start']
-        if 'dateTime' in start_data:
-            try:
-                event_start_time_utc = datetime.datetime.fromisoformat(start_data['dateTime'].replace('Z', '+00:00'))
-            except ValueError:
-                logger.warning(f"Could not parse '{start_data['dateTime']}' with fromisoformat for event {event_summary}. Trying strptime.")
-                try:
-                    event_start_time_utc = datetime.datetime.strptime(start_data['dateTime'], "%Y-%m-%dT%H:%M:%S%z")
-                except ValueError:
-                    logger.error(f"Failed to parse event start time for {event_summary}: {start_data['dateTime']}")
-                    continue
-
-            event_start_time_local = event_start_time_utc.astimezone(LOCAL_TIMEZONE)
-
-            time_to_event = event_start_time_local - now_local
-
-            reminder_thresholds = [
-                15,
-                5,
-                1,
-            ]
-
-            if datetime.timedelta(minutes=-5) < time_to_event <= datetime.timedelta(seconds=0):
-                if not SENT_REMINDERS[event_id].get('started', False):
-                    title = f"Event Started: {event_summary}"
-                    message = f"It's happening now! Link: {event_html_link}"
-                    send_notification(title, message)
-                    SENT_REMINDERS[event_id]['started'] = True
-                    logger.info(f"Notification sent for '{event_summary}' as it started.")
+        if started_lo < time_to_event_secs <= started_hi:
+            if flags & flag_started:
+                return 0
+            title = f"Event Started: {event_summary}"
+            message = f"It's happening now! Link: {event_html_link}"
+            notify(title, message)
+            log.info(f"Notification sent for '{event_summary}' as it started.")
+            return flag_started
+
+        if time_to_event_secs <= 0:
+            return 0
+
+        for threshold_minutes, threshold_secs, bit in thresholds:
+            if trigger_lo <= time_to_event_secs - threshold_secs < trigger_hi and not (flags & bit):
+                title = f"Upcoming Event: {event_summary}"
+                minutes_left = int(time_to_event_secs // 60)
+                if minutes_left == 0:
+                    minutes_text = "less than a minute"
+                else:
+                    minutes_text = f"{minutes_left} minutes"
+
+                # Only format the start time once a reminder is actually going out.
+                start_text = f"{event_start_time_local.strftime('%I:%M %p')} ({tzname_for(event_start_time_local.date())})"
+                message = (
+                    f"Starts in approx. {minutes_text} at {start_text}.\n"
+                    f"Link: {event_html_link}"
+                )
+                notify(title, message)
+                log.info(f"Reminder sent for '{event_summary}' for {threshold_minutes} min threshold.")
+                return bit
+        return 0
+
+    return check
+
+_CHECK = _make_checker(_THRESHOLD_BITS)
+
+async def check_and_remind(service):
+    loop = asyncio.get_running_loop()
+    now_local = datetime.datetime.now(LOCAL_TIMEZONE)
+    logger.info(f"Running reminder check at {now_local.strftime('%Y-%m-%d %H:%M:%S')}")
+    changed = purge_sent_reminders(now_local)
+
+    events = await loop.run_in_executor(None, sync_events, service, now_local)
+    evict_past_events(now_local)
+
+    for event_id, (start, event) in events.items():
+        flags = SENT_REMINDERS.get(event_id, 0)
+        if flags:
+            if _REMINDER_STARTS.get(event_id) != _reminder_start(start):
+                # The event was rescheduled, so the reminders sent so far were for
+                # another start time.
+                flags = 0
+                del SENT_REMINDERS[event_id]
+                _REMINDER_STARTS.pop(event_id, None)
+                changed = True
+            elif flags & _FLAGS_DONE:
                 continue
 
-            for threshold_minutes in sorted(reminder_thresholds, reverse=True):
-                threshold_timedelta = datetime.timedelta(minutes=threshold_minutes)
-
-                if datetime.timedelta(seconds=-10) <= (time_to_event - threshold_timedelta) < datetime.timedelta(minutes=1) and \
-                   time_to_event > datetime.timedelta(seconds=0) and \
-                   not SENT_REMINDERS[event_id].get(threshold_minutes, False):
-
-                    title = f"Upcoming Event: {event_summary}"
-                    minutes_left = int(time_to_event.total_seconds() // 60)
-                    if minutes_left == 0:
-                        minutes_text = "less than a minute"
-                    else:
-                        minutes_text = f"{minutes_left} minutes"
-
-                    message = (
-                        f"Starts in approx. {minutes_text} "
-                        f"at {event_start_time_local.strftime('%I:%M %p')} ({LOCAL_TIMEZONE.tzname(event_start_time_local)}).\n"
-                        f"Link: {event_html_link}"
-                    )
-                    send_notification(title, message)
-                    SENT_REMINDERS[event_id][threshold_minutes] = True
-                    logger.info(f"Reminder sent for '{event_summary}' for {threshold_minutes} min threshold.")
-                    break
-
-        else:
-            event_date_str = start_data['date']
-            event_date = datetime.datetime.strptime(event_date_str, "%Y-%m-%d").date()
-            if event_date == now_local.date() and not SENT_REMINDERS[event_id].get('all_day_today', False):
-                title = f"All-Day Event Today: {event_summary}"
-                message = f"This all-day event is happening today! Details: {event_html_link}"
-                send_notification(title, message)
-                SENT_REMINDERS[event_id]['all_day_today'] = True
-                logger.info(f"All-day event notification sent for '{event_summary}'.")
+        flag = _CHECK(event, start, now_local, flags)
+        if flag:
+            SENT_REMINDERS[event_id] = flags | flag
+            _REMINDER_STARTS[event_id] = _reminder_start(start)
+            changed = True
+
+    if changed:
+        await loop.run_in_executor(None, save_sent_reminders)
+
+async def run_bot(service):
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        check_and_remind,
+        IntervalTrigger(seconds=60),
+        args=[service],
+        id='reminder_tick',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=30,
+    )
+    scheduler.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        scheduler.shutdown()
 
 if __name__ == '__main__':
     service = get_calendar_service()
+    load_sent_reminders()
 
     print("\n--- Starting Virtual Event Reminder Bot ---")
     print(f"Bot will check for events every 60 seconds (1 minute) in timezone: {LOCAL_TIMEZONE.tzname(datetime.datetime.now(LOCAL_TIMEZONE))}")
     print("Press Ctrl+C to stop the bot.")
 
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(lambda: check_and_remind(service), IntervalTrigger(seconds=60))
-    scheduler.start()
-
     try:
-        while True:
-            datetime.datetime.now()
-            pass
+        asyncio.run(run_bot(service))
     except (KeyboardInterrupt, SystemExit):
         logger.info("Bot stopped by user (KeyboardInterrupt/SystemExit).")
-        scheduler.shutdown()
         print("Scheduler shut down. Exiting.")
\ No newline at end of file